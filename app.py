@@ -1,11 +1,13 @@
 
 import os
+import time
 import requests
+import pandas as pd
 import datetime as dt
-from dateutil import parser as dtparse
-from dateutil import tz
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
 import streamlit as st
-import re  
+import re
 from dotenv import load_dotenv
 
 # Load environment variables from .env file
@@ -15,20 +17,57 @@ load_dotenv()
 # Helpers
 # -----------------------------
 
-def iso_to_seconds(iso):
-    import re
-    m = re.match(r"PT(?:(\d+)H)?(?:(\d+)M)?(?:(\d+)S)?", iso)
-    h = int(m.group(1) or 0); m_ = int(m.group(2) or 0); s = int(m.group(3) or 0)
-    return h*3600 + m_*60 + s
+# every call goes to googleapis.com, so keep one pooled keep-alive session for
+# the whole process instead of paying a fresh TCP+TLS handshake per request.
+# cache_resource keeps it alive across reruns, which re-execute this module.
+@st.cache_resource
+def _session():
+    session = requests.Session()
+    session.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=16))
+    return session
+
+_CHANNEL_ID = re.compile(r"UC[0-9A-Za-z_-]{22}")
+# all channel URL forms in one pattern: /channel/UC..., /@handle, /user/Name, /c/Name
+_CHANNEL_URL = re.compile(
+    r"/(?:channel/(UC[0-9A-Za-z_-]{22})|@([A-Za-z0-9_.-]+)|user/([A-Za-z0-9]+)|c/([A-Za-z0-9_.-]+))"
+)
 
-def chunk(lst, n):
-    for i in range(0, len(lst), n):
-        yield lst[i:i+n]
+def iso_to_seconds(iso):
+    # YouTube durations are always P[#D]T[#H][#M][#S], so a few partitions
+    # are enough; no regex needed
+    days, _, s = iso[1:].partition("T")
+    d = int(days[:-1]) if days.endswith("D") else 0
+    h = m_ = sec = 0
+    if "H" in s:
+        hp, _, s = s.partition("H"); h = int(hp)
+    if "M" in s:
+        mp, _, s = s.partition("M"); m_ = int(mp)
+    if "S" in s:
+        sp, _, s = s.partition("S"); sec = int(sp)
+    return d*86400 + h*3600 + m_*60 + sec
+
+def memo(name, key, compute):
+    """Returns the value kept in st.session_state[name] if it was built for the
+    same key, otherwise calls compute() and keeps that instead. Lets reruns
+    triggered by unrelated widgets skip O(N) work over the loaded videos."""
+    slot = st.session_state.get(name)
+    if slot is None or slot[0] != key:
+        slot = (key, compute())
+        st.session_state[name] = slot
+    return slot[1]
+
+def thumbnail_url(video_id):
+    # hqdefault exists for every public video, so only the few thumbnails we
+    # actually render get a URL, built on demand
+    return f"https://i.ytimg.com/vi/{video_id}/hqdefault.jpg"
 
 # -----------------------------
 # Channel resolver (handle/URL -> channel ID)
 # -----------------------------
+# Handle/URL -> ID and ID -> uploads playlist are effectively immutable, so these
+# are cached for a day to keep widget reruns from spending API quota.
 
+@st.cache_data(show_spinner=False, ttl=24*60*60)
 def resolve_to_channel_id(api_key: str, input_str: str) -> str:
     """Accepts a channel ID, handle like @marvel, or any YouTube channel URL
     and returns the canonical channel ID (UCxxxxxxxxxxxx...)."""
@@ -37,31 +76,21 @@ def resolve_to_channel_id(api_key: str, input_str: str) -> str:
         raise ValueError("Empty channel input.")
 
     # Already a channel ID?
-    if re.fullmatch(r"UC[0-9A-Za-z_-]{22}", s):
+    if _CHANNEL_ID.fullmatch(s):
         return s
 
     # URL forms
     if s.startswith("http://") or s.startswith("https://"):
-        # /channel/UC...
-        m = re.search(r"/channel/(UC[0-9A-Za-z_-]{22})", s)
-        if m:
-            return m.group(1)
-
-        # /@handle
-        m = re.search(r"/@([A-Za-z0-9_.-]+)", s)
-        if m:
-            handle = "@" + m.group(1)
-            return channel_id_from_handle(api_key, handle)
-
-        # /user/LegacyName
-        m = re.search(r"/user/([A-Za-z0-9]+)", s)
+        m = _CHANNEL_URL.search(s)
         if m:
-            return channel_id_from_username(api_key, m.group(1))
-
-        # /c/CustomName or other custom URL
-        m = re.search(r"/c/([A-Za-z0-9_.-]+)", s)
-        if m:
-            return channel_id_from_search(api_key, m.group(1))
+            cid, handle, user, custom = m.groups()
+            if cid:
+                return cid
+            if handle:
+                return channel_id_from_handle(api_key, "@" + handle)
+            if user:
+                return channel_id_from_username(api_key, user)
+            return channel_id_from_search(api_key, custom)
 
         # Fallback: last path piece
         tail = s.rstrip("/").split("/")[-1]
@@ -74,30 +103,34 @@ def resolve_to_channel_id(api_key: str, input_str: str) -> str:
     # Plain legacy username or custom name
     return channel_id_from_username(api_key, s)
 
+@st.cache_data(show_spinner=False, ttl=24*60*60)
 def channel_id_from_handle(api_key, handle):
     url = "https://www.googleapis.com/youtube/v3/channels"
-    r = requests.get(url, params={"part": "id", "forHandle": handle, "key": api_key}).json()
+    r = _session().get(url, params={"part": "id", "forHandle": handle, "fields": "items/id", "key": api_key}).json()
     items = r.get("items", [])
     if not items:
         raise ValueError(f"Handle not found: {handle}")
     return items[0]["id"]
 
+@st.cache_data(show_spinner=False, ttl=24*60*60)
 def channel_id_from_username(api_key, username):
     url = "https://www.googleapis.com/youtube/v3/channels"
-    r = requests.get(url, params={"part": "id", "forUsername": username, "key": api_key}).json()
+    r = _session().get(url, params={"part": "id", "forUsername": username, "fields": "items/id", "key": api_key}).json()
     items = r.get("items", [])
     if not items:
         # Fallback to search if legacy username fails
         return channel_id_from_search(api_key, username)
     return items[0]["id"]
 
+@st.cache_data(show_spinner=False, ttl=24*60*60)
 def channel_id_from_search(api_key, query):
     url = "https://www.googleapis.com/youtube/v3/search"
-    r = requests.get(url, params={
+    r = _session().get(url, params={
         "part": "snippet",
         "type": "channel",
         "q": query,
         "maxResults": 1,
+        "fields": "items/id/channelId",
         "key": api_key
     }).json()
     items = r.get("items", [])
@@ -109,11 +142,13 @@ def channel_id_from_search(api_key, query):
 # API wrappers
 # -----------------------------
 
+@st.cache_data(show_spinner=False, ttl=24*60*60)
 def get_uploads_playlist_id(api_key, channel_id):
     url = "https://www.googleapis.com/youtube/v3/channels"
-    r = requests.get(url, params={
+    r = _session().get(url, params={
         "part": "contentDetails",
         "id": channel_id,
+        "fields": "items/contentDetails/relatedPlaylists/uploads",
         "key": api_key
     })
     r.raise_for_status()
@@ -122,79 +157,121 @@ def get_uploads_playlist_id(api_key, channel_id):
         raise ValueError("Channel not found or API key/channel ID invalid.")
     return items[0]["contentDetails"]["relatedPlaylists"]["uploads"]
 
-def list_upload_video_ids(api_key, uploads_playlist_id, max_items=200):
+def iter_upload_video_id_pages(api_key, uploads_playlist_id, max_items=200):
+    """Yields the uploads playlist one page (<= 50 IDs) at a time so callers
+    can start working on a page while the next one is still being fetched."""
     url = "https://www.googleapis.com/youtube/v3/playlistItems"
-    ids = []
-    token = None
-    while True:
-        r = requests.get(url, params={
+    # looked up here so the prefetch thread only uses the session, never the cache
+    session = _session()
+
+    def get_page(token):
+        r = session.get(url, params={
             "part": "contentDetails",
             "playlistId": uploads_playlist_id,
             "maxResults": 50,
             "pageToken": token,
+            "fields": "nextPageToken,items/contentDetails/videoId",
             "key": api_key
-        })
+        }, timeout=10)
         r.raise_for_status()
-        data = r.json()
-        ids.extend([it["contentDetails"]["videoId"] for it in data.get("items", [])])
-        token = data.get("nextPageToken")
-        if not token or len(ids) >= max_items:
-            break
-    return ids[:max_items]
-
-def fetch_video_details(api_key, video_ids):
-    if not video_ids:
-        return []
+        return r.json()
+
+    # playlistItems has no offsets, only page tokens, so the best we can do is
+    # request page N+1 the moment its token shows up and handle page N meanwhile
+    seen = 0
+    with ThreadPoolExecutor(max_workers=1) as prefetch:
+        pending = prefetch.submit(get_page, None)
+        while pending is not None:
+            data = pending.result()
+            items = data.get("items", [])
+            token = data.get("nextPageToken")
+            remaining = max_items - seen
+            pending = prefetch.submit(get_page, token) if token and len(items) < remaining else None
+            page = [it["contentDetails"]["videoId"] for it in items[:remaining]]
+            seen += len(page)
+            if page:
+                yield page
+
+# only the leaves we turn into columns; trims videos.list pages several-fold
+_VIDEO_FIELDS = "items(id,snippet(title,publishedAt),contentDetails/duration,statistics(likeCount,commentCount))"
+
+def fetch_video_details(api_key, id_groups):
+    """id_groups is any iterable of <= 50-ID lists (e.g. the pages coming out of
+    iter_upload_video_id_pages). Each group is submitted to the pool as soon as
+    it is produced, so detail lookups overlap with playlist pagination."""
     url = "https://www.googleapis.com/youtube/v3/videos"
-    out = []
-    for group in chunk(video_ids, 50):
-        r = requests.get(url, params={
+    # looked up here so the workers only use the session, never the cache
+    session = _session()
+
+    def fetch_group(group):
+        r = session.get(url, params={
             "part": "snippet,contentDetails,statistics",
             "id": ",".join(group),
+            "fields": _VIDEO_FIELDS,
             "key": api_key
-        })
+        }, timeout=10)
         r.raise_for_status()
         data = r.json()
+        rows = []
         for it in data.get("items", []):
             stats = it.get("statistics", {})
             snippet = it.get("snippet", {})
-            thumbs = snippet.get("thumbnails", {})
-            # pick a decent thumbnail
-            thumb = (thumbs.get("maxres") or thumbs.get("standard") or thumbs.get("high") or 
-                     thumbs.get("medium") or thumbs.get("default") or {}).get("url")
-            out.append({
-                "id": it["id"],
-                "title": snippet.get("title", ""),
-                "url": f"https://www.youtube.com/watch?v={it['id']}",
-                "publishedAt": dtparse.parse(snippet.get("publishedAt")) if snippet.get("publishedAt") else None,
-                "duration_seconds": iso_to_seconds(it["contentDetails"]["duration"]),
-                "likes": int(stats.get("likeCount", 0)) if stats.get("likeCount", "0").isdigit() else 0,
-                "comments": int(stats.get("commentCount", 0)) if stats.get("commentCount", "0").isdigit() else 0,
-                "thumbnail": thumb,
-            })
+            published = snippet.get("publishedAt")
+            # only the Unix timestamp is kept; sorting and range masks work on it
+            published_ts = int(dt.datetime.fromisoformat(published.replace("Z", "+00:00")).timestamp()) if published else 0
+            vid = it["id"]
+            title = snippet.get("title", "")
+            # one tuple per video, in VIDEO_COLUMNS order
+            rows.append((
+                vid,
+                title,
+                f"https://www.youtube.com/watch?v={vid}",
+                published_ts,
+                iso_to_seconds(it["contentDetails"]["duration"]),
+                int(stats.get("likeCount") or 0),
+                int(stats.get("commentCount") or 0),
+            ))
+        return rows
+
+    # each page is an independent network call, so fire them off as they arrive
+    out = []
+    with ThreadPoolExecutor(max_workers=8) as ex:
+        futures = [ex.submit(fetch_group, group) for group in id_groups]
+        for f in futures:
+            out.extend(f.result())
     return out
 
-def in_range(ts, start, end):
-    if ts is None:
-        return False
-    return (ts >= start) and (ts < end)
+VIDEO_COLUMNS = ["id", "title", "url", "published_ts", "duration_seconds", "likes", "comments"]
+
+def to_frame(rows):
+    df = pd.DataFrame.from_records(rows, columns=VIDEO_COLUMNS)
+    return df.astype({"published_ts": "int64", "likes": "int32", "comments": "int32", "duration_seconds": "int32"})
+
+def range_mask(ts, start, end):
+    """Boolean mask over a published_ts array for start <= ts < end.
+    Undated videos carry ts 0, so they fall out of every range."""
+    return (ts >= int(start.timestamp())) & (ts < int(end.timestamp()))
 
-def compute_kpis(videos, start, end, short_threshold_sec=60):
-    items = [v for v in videos if in_range(v["publishedAt"], start, end)]
-    videos_only = [v for v in items if v["duration_seconds"] > short_threshold_sec]
-    shorts_only = [v for v in items if v["duration_seconds"] <= short_threshold_sec]
+def compute_range_kpis(df, masks):
+    """masks maps a range name to its boolean mask over df. The columns are
+    pulled out once and shared by every range, so each range only costs a
+    couple of reductions over its own rows."""
+    likes = df["likes"].to_numpy()
+    comments = df["comments"].to_numpy()
 
-    def top_by(key, pool):
-        return max(pool, key=lambda x: x.get(key, 0)) if pool else None
+    out = {}
+    for name, mask in masks.items():
+        idx = mask.nonzero()[0]
 
-    return {
-        "items": items,
-        "count_total": len(items),
-        "count_videos": len(videos_only),
-        "count_shorts": len(shorts_only),
-        "most_liked": top_by("likes", items),
-        "most_commented": top_by("comments", items),
-    }
+        def top_by(col):
+            return df.iloc[idx[col[idx].argmax()]] if len(idx) else None
+
+        out[name] = {
+            "count_total": len(idx),
+            "most_liked": top_by(likes),
+            "most_commented": top_by(comments),
+        }
+    return out
 
 # -----------------------------
 # UI
@@ -213,7 +290,6 @@ with st.sidebar:
     raw_input = st.text_input("Channel handle or URL")
     max_items = st.slider("Max uploads to scan (most recent)", min_value=50, max_value=1000, value=300, step=50)
     short_threshold = st.number_input("Shorts threshold (seconds ≤)", min_value=15, max_value=180, value=60, step=5)
-    tz_local = tz.tzlocal()
     st.caption("Tip: Add env var YT_API_KEY to avoid pasting every time.")
 
 if not api_key or not raw_input:
@@ -228,77 +304,111 @@ except Exception as e:
     st.error(f"Channel resolve error: {e}")
     st.stop()
 
-@st.cache_data(show_spinner=True, ttl=3600)
-def load_channel_data(api_key, channel_id, max_items):
+CHANNEL_DATA_TTL = 3600
+
+# Persisted to disk so a restart or redeploy doesn't cold-start every channel.
+# Streamlit ignores ttl on disk-persisted caches, so each entry carries its own
+# fetch time and load_channel_frame expires it by hand. max_entries bounds the
+# in-memory layer; on disk there is one pickle per (api_key, channel, max_items),
+# replaced whenever that entry is refreshed.
+@st.cache_data(show_spinner=True, persist="disk", max_entries=32)
+def load_channel_rows(api_key, channel_id, max_items):
+    """Returns (fetched_at, rows). Only the plain row tuples are cached; the
+    DataFrame, along with anything derivable from the rows, is built from them
+    once per session instead."""
     uploads = get_uploads_playlist_id(api_key, channel_id)
-    ids = list_upload_video_ids(api_key, uploads, max_items=max_items)
-    details = fetch_video_details(api_key, ids)
+    pages = iter_upload_video_id_pages(api_key, uploads, max_items=max_items)
+    return time.time(), fetch_video_details(api_key, pages)
+
+def build_channel_frame(rows):
+    df = to_frame(rows)
+    # lower-cased once here so keyword filtering is a plain substring test
+    df["title_lc"] = df["title"].str.lower()
     # sort newest first
-    details.sort(key=lambda x: x["publishedAt"] or dt.datetime.min.replace(tzinfo=dt.timezone.utc), reverse=True)
-    return details
+    return df.sort_values("published_ts", ascending=False, kind="stable", ignore_index=True)
+
+def load_channel_frame(api_key, channel_id, max_items):
+    """Returns (data_key, df), where data_key is (channel_id, max_items, fetched_at).
+    The frame is kept in session state and reused without touching the cache
+    until it is CHANNEL_DATA_TTL old, so reruns don't unpickle the rows. Only
+    an expired entry is cleared and fetched again; other channels keep theirs."""
+    slot = st.session_state.get("df")
+    if slot is not None:
+        (cid, n, fetched_at), _ = slot
+        if (cid, n) == (channel_id, max_items) and time.time() - fetched_at <= CHANNEL_DATA_TTL:
+            return slot
+
+    fetched_at, rows = load_channel_rows(api_key, channel_id, max_items)
+    if time.time() - fetched_at > CHANNEL_DATA_TTL:
+        load_channel_rows.clear(api_key, channel_id, max_items)
+        fetched_at, rows = load_channel_rows(api_key, channel_id, max_items)
+    data_key = (channel_id, max_items, fetched_at)
+    return data_key, memo("df", data_key, lambda: build_channel_frame(rows))
 
 try:
-    videos = load_channel_data(api_key, channel_id, max_items)
+    data_key, df = load_channel_frame(api_key, channel_id, max_items)
 except Exception as e:
     st.error(f"Error loading channel data: {e}")
     st.stop()
 
+# classify shorts once per threshold; every count below is a sum over this
+is_short = memo("is_short", (data_key, short_threshold),
+                lambda: df["duration_seconds"].to_numpy() <= short_threshold)
+n_shorts = int(is_short.sum())
+n_videos = len(df) - n_shorts
+
 col_search = st.columns([3,1,1,1,1])
 
 with col_search[0]:
     st.text_input("Search here..", placeholder="Filter by title keyword (optional)", key="search_kw")
 with col_search[1]:
     st.markdown("&nbsp;")
-    st.metric("Total Loaded", len(videos))
+    st.metric("Total Loaded", len(df))
 with col_search[2]:
     st.markdown("&nbsp;")
-    st.metric("Videos (>{}s)".format(short_threshold), len([v for v in videos if v["duration_seconds"] > short_threshold]))
+    st.metric("Videos (>{}s)".format(short_threshold), n_videos)
 with col_search[3]:
     st.markdown("&nbsp;")
-    st.metric("Shorts (≤{}s)".format(short_threshold), len([v for v in videos if v["duration_seconds"] <= short_threshold]))
+    st.metric("Shorts (≤{}s)".format(short_threshold), n_shorts)
 with col_search[4]:
     st.markdown("&nbsp;")
-    st.metric("Time Zone", str(dt.datetime.now(tz_local).tzname()))
+    st.metric("Time Zone", str(dt.datetime.now().astimezone().tzname()))
 
 # Date ranges
 now_utc = dt.datetime.now(dt.timezone.utc)
-today_start_local = dt.datetime.now(tz_local).replace(hour=0, minute=0, second=0, microsecond=0)
+# Boundaries are built as naive local times and converted one at a time, so each
+# picks up its own UTC offset and stays right across DST changes.
+today_start_local = dt.datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
 today_start = today_start_local.astimezone(dt.timezone.utc)
 month_start_local = today_start_local.replace(day=1)
 month_start = month_start_local.astimezone(dt.timezone.utc)
 
-# Custom dates
-st.subheader("Date Range Filters")
-c1, c2, c3 = st.columns([1,1,2])
-with c1:
-    custom_start = st.date_input("Custom Start", value=dt.datetime.now().date().replace(day=1))
-with c2:
-    custom_end = st.date_input("Custom End", value=dt.datetime.now().date())
-with c3:
-    st.write(" ")
-
-custom_start_dt = dt.datetime.combine(custom_start, dt.time(0,0,0), tzinfo=tz_local).astimezone(dt.timezone.utc)
-custom_end_dt = dt.datetime.combine(custom_end, dt.time(23,59,59), tzinfo=tz_local).astimezone(dt.timezone.utc)
-
 # Optional keyword filter
 kw = st.session_state.get("search_kw", "").strip().lower()
-videos_filtered = [v for v in videos if kw in v["title"].lower()] if kw else videos
+df_filtered = memo("df_filtered", (data_key, kw),
+                   lambda: df[df["title_lc"].str.contains(kw, regex=False)] if kw else df)
+
+# Range masks, built once per render over the filtered timestamps, and the
+# fixed ranges' KPIs computed in a single pass
+ts = df_filtered["published_ts"].to_numpy()
+kpis = compute_range_kpis(df_filtered, {
+    "Today": range_mask(ts, today_start, now_utc),
+    "This Month": range_mask(ts, month_start, now_utc),
+})
 
 # KPI sections
-def kpi_row(title, start, end):
-    k = compute_kpis(videos_filtered, start, end, short_threshold_sec=short_threshold)
+def kpi_row(title, k, warn_if_empty=False):
     colA, colB, colC = st.columns(3)
     with colA:
         st.markdown("### "+title)
         st.metric("No. of Posts", k["count_total"])
-        if start == today_start and k["count_total"] == 0:
+        if warn_if_empty and k["count_total"] == 0:
             st.error("🚨 No Post Today — Go & Do Post")
     with colB:
         ml = k["most_liked"]
         st.markdown("**Most Liked**")
-        if ml:
-            if ml["thumbnail"]:
-                st.image(ml["thumbnail"], use_container_width=True)
+        if ml is not None:
+            st.image(thumbnail_url(ml["id"]), use_container_width=True)
             st.markdown(f"[{ml['title']}]({ml['url']})")
             st.caption(f"👍 {ml['likes']} · 💬 {ml['comments']}")
         else:
@@ -306,19 +416,36 @@ def kpi_row(title, start, end):
     with colC:
         mc = k["most_commented"]
         st.markdown("**Most Commented**")
-        if mc:
-            if mc["thumbnail"]:
-                st.image(mc["thumbnail"], use_container_width=True)
+        if mc is not None:
+            st.image(thumbnail_url(mc["id"]), use_container_width=True)
             st.markdown(f"[{mc['title']}]({mc['url']})")
             st.caption(f"💬 {mc['comments']} · 👍 {mc['likes']}")
         else:
             st.caption("No items in range.")
 
+# The date pickers live in a fragment, so changing them only reruns this block
+# instead of recomputing and re-rendering the Today / This Month rows.
+@st.fragment
+def custom_range_block():
+    st.subheader("Date Range Filters")
+    c1, c2, c3 = st.columns([1,1,2])
+    with c1:
+        custom_start = st.date_input("Custom Start", value=dt.datetime.now().date().replace(day=1))
+    with c2:
+        custom_end = st.date_input("Custom End", value=dt.datetime.now().date())
+    with c3:
+        st.write(" ")
+
+    custom_start_dt = dt.datetime.combine(custom_start, dt.time(0,0,0)).astimezone(dt.timezone.utc)
+    custom_end_dt = dt.datetime.combine(custom_end, dt.time(23,59,59)).astimezone(dt.timezone.utc)
+    k = compute_range_kpis(df_filtered, {"Custom Range": range_mask(ts, custom_start_dt, custom_end_dt)})
+    kpi_row("Custom Range", k["Custom Range"])
+
 st.divider()
-kpi_row("Today", today_start, now_utc)
+kpi_row("Today", kpis["Today"], warn_if_empty=True)
 st.divider()
-kpi_row("This Month", month_start, now_utc)
+kpi_row("This Month", kpis["This Month"])
 st.divider()
-kpi_row("Custom Range", custom_start_dt, custom_end_dt)
+custom_range_block()
 
 st.caption("Note: 'Shorts' are inferred as videos with duration ≤ threshold (default 60s). YouTube Data API does not expose a direct 'shares' metric; for 'Most Shared', use the YouTube Analytics API with OAuth.")